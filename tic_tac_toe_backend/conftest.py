@@ -0,0 +1,4 @@
+import os
+
+# auth.py refuses to import without a signing key; tests never issue real tokens
+os.environ.setdefault("JWT_SECRET", "test-secret")
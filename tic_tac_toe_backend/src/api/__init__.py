@@ -1,4 +1,4 @@
 from .db import (
-    Base, get_engine, get_session_factory, init_db,
+    Base, get_engine, get_session_factory, get_db, init_db, EMPTY_BOARD_STATE,
     User, Game, Move, MatchHistory
 )
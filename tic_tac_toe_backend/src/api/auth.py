@@ -1,12 +1,19 @@
 import os
+import hashlib
+import hmac
+import json
+import threading
+import time
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+import jwt
 from passlib.context import CryptContext
+from cachetools import TTLCache
+import redis
 from dotenv import load_dotenv
 
-from .db import get_session_factory, User
+from .db import get_db, SELECT_USER_BY_USERNAME
 
 from sqlalchemy.orm import Session
 
@@ -15,20 +22,71 @@ load_dotenv()
 
 SECRET_KEY = os.getenv("JWT_SECRET")
 ALGORITHM = "HS256"
+# Built once and reused for every decode
+_DECODE_ALGORITHMS = [ALGORITHM]
+_DECODE_OPTIONS = {"require": ["exp", "sub"], "verify_exp": True}
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
 if not SECRET_KEY:
     raise RuntimeError("JWT_SECRET environment variable not set!")
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing: new hashes use argon2; legacy bcrypt hashes still verify
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Short-lived cache of decoded JWT payloads, keyed by SHA-256 of the raw token
+TOKEN_CACHE_TTL_SECONDS = 30
+_token_cache = TTLCache(maxsize=10000, ttl=TOKEN_CACHE_TTL_SECONDS)
+# cachetools caches are not thread-safe and get_current_user runs in FastAPI's threadpool
+_token_cache_lock = threading.Lock()
+
+# Optional shared payload cache across workers (set REDIS_URL to enable); entries are HMAC-signed
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_TOKEN_TTL_CAP_SECONDS = 60
+_redis = redis.Redis.from_url(REDIS_URL, socket_timeout=0.05) if REDIS_URL else None
+
+def _sign_shared_entry(key: str, body: bytes) -> bytes:
+    """HMAC over the cache key and payload JSON, so a Redis writer cannot forge or move entries."""
+    return hmac.new(SECRET_KEY.encode(), key.encode() + b"." + body, hashlib.sha256).hexdigest().encode()
+
+def _get_shared_payload(key: str):
+    """Fetch a decoded payload from Redis; None on miss, bad signature, when disabled, or on Redis errors."""
+    if _redis is None:
+        return None
+    try:
+        raw = _redis.get(f"jwt:{key}")
+    except redis.RedisError:
+        return None
+    if not raw:
+        return None
+    signature, _, body = raw.partition(b".")
+    if not hmac.compare_digest(signature, _sign_shared_entry(key, body)):
+        return None
+    return json.loads(body)
+
+def _set_shared_payload(key: str, payload: dict):
+    """Store a signed decoded payload in Redis until the token expires (capped); errors are ignored."""
+    if _redis is None:
+        return
+    ttl = min(int(payload["exp"] - time.time()), REDIS_TOKEN_TTL_CAP_SECONDS)
+    if ttl <= 0:
+        return
+    body = json.dumps(payload).encode()
+    try:
+        _redis.setex(f"jwt:{key}", ttl, _sign_shared_entry(key, body) + b"." + body)
+    except redis.RedisError:
+        pass
+
 # PUBLIC_INTERFACE
 def verify_password(plain_password, hashed_password):
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
+# PUBLIC_INTERFACE
+def verify_and_update_password(plain_password, hashed_password):
+    """Verify a password; also return a replacement hash if the stored one uses a deprecated scheme."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 # PUBLIC_INTERFACE
 def get_password_hash(password):
     """Hash a password for storage."""
@@ -43,21 +101,32 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 # PUBLIC_INTERFACE
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_session_factory())):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Decode JWT and load user from database for protected routes."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials.",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    key = hashlib.sha256(token.encode()).hexdigest()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None and cached[0].get("exp", 0) > time.time():
+        username = cached[1]
+    else:
+        payload = _get_shared_payload(key)
+        if payload is None or payload.get("exp", 0) <= time.time():
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=_DECODE_ALGORITHMS, options=_DECODE_OPTIONS)
+            except jwt.PyJWTError:
+                raise credentials_exception
+            _set_shared_payload(key, payload)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+        with _token_cache_lock:
+            _token_cache[key] = (payload, username)
+    user = db.execute(SELECT_USER_BY_USERNAME, {"username": username}).scalar_one_or_none()
     if user is None:
         raise credentials_exception
     return user
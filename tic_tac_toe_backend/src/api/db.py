@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from sqlalchemy import (
     create_engine,
     Column,
@@ -10,9 +11,12 @@ from sqlalchemy import (
     TIMESTAMP,
     func,
     UniqueConstraint,
+    Index,
     SmallInteger,
+    select,
+    bindparam,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship, scoped_session
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, joinedload
 from dotenv import load_dotenv
 
 # Load environment variables from .env (.env should be in the project root)
@@ -28,22 +32,38 @@ def get_database_url():
     host = os.getenv("DB_HOST")
     port = os.getenv("DB_PORT")
     db = os.getenv("DB_NAME")
-    return f"mysql+mysqlconnector://{user}:{pw}@{host}:{port}/{db}"
+    return f"mysql+mysqldb://{user}:{pw}@{host}:{port}/{db}"
+
+# Board is stored row-major as 9 chars: "X", "O", or " " for an empty cell
+EMPTY_BOARD_STATE = " " * 9
 
 # SQLAlchemy base class
 Base = declarative_base()
 
 # PUBLIC_INTERFACE
+@lru_cache(maxsize=1)
 def get_engine():
-    """Create SQLAlchemy engine using environment variables."""
+    """Create SQLAlchemy engine using environment variables (built once per process)."""
     return create_engine(get_database_url(), pool_pre_ping=True, future=True)
 
 # PUBLIC_INTERFACE
+@lru_cache(maxsize=1)
 def get_session_factory():
     """
-    Return a SQLAlchemy session factory (scoped_session) bound to the engine.
+    Return the process-wide SQLAlchemy session factory bound to the shared engine.
+    """
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+# PUBLIC_INTERFACE
+def get_db():
+    """
+    FastAPI dependency yielding a database session, closed once the request finishes.
     """
-    return scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=get_engine()))
+    db = get_session_factory()()
+    try:
+        yield db
+    finally:
+        db.close()
 
 # ------------------
 # ORM Models
@@ -55,6 +75,7 @@ class User(Base):
 
     id = Column(Integer, primary_key=True)
     username = Column(String(32), nullable=False, unique=True)
+    username_lc = Column(String(32), nullable=False, unique=True, index=True)  # normalized for lookups
     email = Column(String(255), nullable=False, unique=True)
     password_hash = Column(String(255), nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
@@ -90,6 +111,8 @@ class Game(Base):
     end_time = Column(DateTime, nullable=True, default=None)
     winner_id = Column(Integer, ForeignKey("users.id"), nullable=True, default=None)
     game_mode = Column(Enum("vs_player", "vs_computer", name="game_mode"), server_default="vs_player")
+    board_state = Column(String(9), nullable=False, default=EMPTY_BOARD_STATE, server_default=EMPTY_BOARD_STATE)
+    move_count = Column(SmallInteger, nullable=False, default=0, server_default="0")
 
     # Relationships
     player_x = relationship("User", foreign_keys=[player_x_id], back_populates="games_x")
@@ -106,7 +129,7 @@ class Move(Base):
     id = Column(Integer, primary_key=True)
     game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), nullable=False)
     move_number = Column(Integer, nullable=False)
-    player_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    player_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # NULL for computer moves
     row = Column(SmallInteger, nullable=False)  # 0, 1, or 2
     col = Column(SmallInteger, nullable=False)  # 0, 1, or 2
     symbol = Column(Enum("X", "O", name="move_symbol"), nullable=False)
@@ -116,6 +139,7 @@ class Move(Base):
     game = relationship("Game", back_populates="moves")
     player = relationship("User", back_populates="moves")
 
+    # The unique constraint's index also serves "WHERE game_id = ? ORDER BY move_number"
     __table_args__ = (
         UniqueConstraint("game_id", "move_number", name="uq_game_id_move_number"),
     )
@@ -140,6 +164,40 @@ class MatchHistory(Base):
     player_o = relationship("User", foreign_keys=[player_o_id], back_populates="match_history_o")
     winner = relationship("User", foreign_keys=[winner_id], back_populates="match_history_winner")
 
+    # Serve the per-player history lookup (either seat, newest first)
+    __table_args__ = (
+        Index("ix_mh_px_finished", "player_x_id", "finished_at"),
+        Index("ix_mh_po_finished", "player_o_id", "finished_at"),
+    )
+
+# ------------------
+# Prebuilt statements (compiled once, reused through SQLAlchemy's statement cache)
+# ------------------
+
+SELECT_USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+SELECT_USER_BY_USERNAME_LC = select(User).where(User.username_lc == bindparam("username_lc"))
+SELECT_GAME_WITH_PLAYERS = (
+    select(Game)
+    .options(joinedload(Game.player_x), joinedload(Game.player_o), joinedload(Game.winner))
+    .where(Game.id == bindparam("game_id"))
+)
+SELECT_GAME_MOVES = (
+    select(Move)
+    .options(joinedload(Move.player))
+    .where(Move.game_id == bindparam("game_id"))
+    .order_by(Move.move_number)
+)
+SELECT_USER_HISTORY = (
+    select(MatchHistory)
+    .options(
+        joinedload(MatchHistory.player_x),
+        joinedload(MatchHistory.player_o),
+        joinedload(MatchHistory.winner),
+    )
+    .where((MatchHistory.player_x_id == bindparam("user_id")) | (MatchHistory.player_o_id == bindparam("user_id")))
+    .order_by(MatchHistory.finished_at.desc())
+)
+
 # PUBLIC_INTERFACE
 def init_db():
     """Create all tables in the database (to be used during setup, not in production)."""
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Body, Path
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from .db import get_session_factory, User, Game, Move, MatchHistory
+from .db import (
+    get_db, User, Game, Move, MatchHistory, EMPTY_BOARD_STATE,
+    SELECT_USER_BY_USERNAME_LC, SELECT_GAME_WITH_PLAYERS, SELECT_GAME_MOVES, SELECT_USER_HISTORY,
+)
 from .auth import get_current_user
 from .schemas import (
     StartGameRequest,
@@ -20,33 +24,85 @@ router = APIRouter(
     tags=["game"],
 )
 
+_EMPTY_BOARD = ((None, None, None), (None, None, None), (None, None, None))
+
 def empty_board():
     """Returns an empty 3x3 tic-tac-toe board."""
-    return [[None for _ in range(3)] for _ in range(3)]
+    return [list(row) for row in _EMPTY_BOARD]
+
+# Winning lines as 9-bit masks; bit i corresponds to cell i of the board string
+WIN_MASKS = (
+    0b000_000_111, 0b000_111_000, 0b111_000_000,  # rows
+    0b001_001_001, 0b010_010_010, 0b100_100_100,  # cols
+    0b100_010_001, 0b001_010_100,  # diagonals
+)
+FULL_BOARD_MASK = 0b111_111_111
+# Winning masks passing through each cell (2 to 4 per cell)
+CELL_WIN_MASKS = tuple(tuple(w for w in WIN_MASKS if w >> idx & 1) for idx in range(9))
+
+# Computer's fallback preference: centre, corners, then edges
+_COMPUTER_CELL_ORDER = (4, 0, 2, 6, 8, 1, 3, 5, 7)
 
-def reconstruct_board(moves: List[Move]) -> List[List[Optional[str]]]:
+_X_BITS = str.maketrans("XO ", "100")
+_O_BITS = str.maketrans("XO ", "010")
+
+def board_rows(board_state: str) -> List[List[Optional[str]]]:
+    """Expand a stored 9-char board string into a 3x3 board."""
     board = empty_board()
-    for move in moves:
-        board[move.row][move.col] = move.symbol
+    for idx, cell in enumerate(board_state):
+        if cell != " ":
+            board[idx // 3][idx % 3] = cell
     return board
 
-def check_winner(board):
-    """Returns 'X', 'O', or None according to win/draw state."""
-    lines = []
-    # rows and cols
-    for i in range(3):
-        lines.append(board[i])  # row
-        lines.append([board[0][i], board[1][i], board[2][i]])  # col
-    # diagonals
-    lines.append([board[0][0], board[1][1], board[2][2]])
-    lines.append([board[0][2], board[1][1], board[2][0]])
-    for line in lines:
-        if line[0] and all(cell == line[0] for cell in line):
-            return line[0]
-    if all(cell is not None for row in board for cell in row):
+def board_masks(board_state: str):
+    """Returns (x_mask, o_mask) for a 9-char board string."""
+    cells = board_state[::-1]
+    return int(cells.translate(_X_BITS), 2), int(cells.translate(_O_BITS), 2)
+
+def check_winner(x_mask: int, o_mask: int, last_idx: int):
+    """Returns 'X', 'O', 'draw', or None, testing only lines through the last cell played."""
+    symbol, mask = ("X", x_mask) if x_mask >> last_idx & 1 else ("O", o_mask)
+    if any((mask & w) == w for w in CELL_WIN_MASKS[last_idx]):
+        return symbol
+    if (x_mask | o_mask) == FULL_BOARD_MASK:
         return "draw"
     return None
 
+def computer_move(board_state: str) -> int:
+    """Pick the computer's (O) cell: complete a line, else block X, else the first free preferred cell."""
+    x_mask, o_mask = board_masks(board_state)
+    free = FULL_BOARD_MASK & ~(x_mask | o_mask)
+    for mask in (o_mask, x_mask):
+        for w in WIN_MASKS:
+            gap = w & ~mask
+            # Exactly one cell of the line is missing and it is still free
+            if gap & free and (gap & (gap - 1)) == 0:
+                return gap.bit_length() - 1
+    for idx in _COMPUTER_CELL_ORDER:
+        if free >> idx & 1:
+            return idx
+    raise ValueError("No free cell for the computer move.")
+
+def record_move(db: Session, game: Game, board_state: str, idx: int, symbol: str, player_id: Optional[int]) -> str:
+    """
+    Append a Move row for `symbol` at cell `idx` and return the updated board string.
+
+    move_count is bumped in Python; uq_game_id_move_number rejects a concurrent move
+    that read the same count, and make_move turns that into a 409.
+    """
+    game.move_count = (game.move_count or 0) + 1
+    db.add(Move(
+        game_id=game.id,
+        move_number=game.move_count,
+        player_id=player_id,
+        row=idx // 3,
+        col=idx % 3,
+        symbol=symbol
+    ))
+    board_state = board_state[:idx] + symbol + board_state[idx + 1:]
+    game.board_state = board_state
+    return board_state
+
 # PUBLIC_INTERFACE
 @router.post(
     "/start",
@@ -58,12 +114,14 @@ def check_winner(board):
 )
 def start_game(
     req: StartGameRequest = Body(...),
-    db: Session = Depends(get_session_factory()),
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new Tic Tac Toe game with an opponent or computer (vs AI)."""
     if req.opponent_username and req.game_mode == "vs_player":
-        opponent = db.query(User).filter(User.username == req.opponent_username.lower()).first()
+        opponent = db.execute(
+            SELECT_USER_BY_USERNAME_LC, {"username_lc": req.opponent_username.lower()}
+        ).scalar_one_or_none()
         if not opponent or opponent.id == current_user.id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -80,7 +138,9 @@ def start_game(
         player_o_id=player_o_id,
         status="in_progress" if player_o_id else "in_progress",
         current_turn="X",
-        game_mode=game_mode
+        game_mode=game_mode,
+        board_state=EMPTY_BOARD_STATE,
+        move_count=0,
     )
     db.add(new_game)
     db.commit()
@@ -102,17 +162,18 @@ def start_game(
     responses={
         200: {"description": "Move accepted. Board updated."},
         400: {"description": "Invalid move or not this user's turn."},
+        409: {"description": "Game was updated by another request; retry."},
         404: {"description": "Game not found."}
     }
 )
 def make_move(
     game_id: int = Path(..., description="ID of the game"),
     move: MoveRequest = Body(...),
-    db: Session = Depends(get_session_factory()),
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Make a move as X or O. Validates turn and move legality."""
-    game = db.query(Game).filter(Game.id == game_id).first()
+    game = db.get(Game, game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
     if game.status not in ("in_progress",):
@@ -132,27 +193,23 @@ def make_move(
     if game.current_turn != symbol:
         raise HTTPException(status_code=400, detail="Not your turn.")
 
-    # Collect all moves and build board
-    moves = db.query(Move).filter(Move.game_id == game_id).order_by(Move.move_number).all()
-    board = reconstruct_board(moves)
-    if board[move.row][move.col] is not None:
+    board_state = game.board_state or EMPTY_BOARD_STATE
+    idx = move.row * 3 + move.col
+    if board_state[idx] != " ":
         raise HTTPException(status_code=400, detail="Cell already occupied.")
 
-    next_move_num = len(moves) + 1
     # Make move
-    move_obj = Move(
-        game_id=game_id,
-        move_number=next_move_num,
-        player_id=current_user.id,
-        row=move.row,
-        col=move.col,
-        symbol=symbol
-    )
-    db.add(move_obj)
-    board[move.row][move.col] = symbol
+    board_state = record_move(db, game, board_state, idx, symbol, current_user.id)
 
     # Check for win/draw after move
-    winner_symbol = check_winner(board)
+    winner_symbol = check_winner(*board_masks(board_state), idx)
+
+    # vs_computer: reply with the computer's O move in the same transaction
+    if winner_symbol is None and game.game_mode == "vs_computer":
+        cpu_idx = computer_move(board_state)
+        board_state = record_move(db, game, board_state, cpu_idx, "O", None)
+        winner_symbol = check_winner(*board_masks(board_state), cpu_idx)
+
     winner_id = None
     is_draw = False
     status = "in_progress"
@@ -183,15 +240,20 @@ def make_move(
         )
         db.add(match_history)
 
-    # Switch turn if still playing
-    if status == "in_progress":
+    # Switch turn if still playing (vs_computer always hands the turn back to X)
+    if status == "in_progress" and game.game_mode != "vs_computer":
         game.current_turn = "O" if game.current_turn == "X" else "X"
-    db.commit()
-    db.refresh(game)
+    # Resolve before commit: expire_on_commit would otherwise reload current_user with a SELECT
+    winner = current_user.username if winner_id == current_user.id else None
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Game was updated by another request; retry.")
     return MoveResponse(
-        board=board,
+        board=board_rows(board_state),
         status=status,
-        winner=current_user.username if winner_id == current_user.id else None,
+        winner=winner,
         is_draw=is_draw
     )
 
@@ -208,11 +270,11 @@ def make_move(
 )
 def get_game_state(
     game_id: int = Path(..., description="ID of the game"),
-    db: Session = Depends(get_session_factory()),
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get board state, move list, status, and player details for a game."""
-    game = db.query(Game).filter(Game.id == game_id).first()
+    game = db.execute(SELECT_GAME_WITH_PLAYERS, {"game_id": game_id}).scalar_one_or_none()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found.")
 
@@ -220,12 +282,12 @@ def get_game_state(
        (game.player_o_id != current_user.id and game.player_o_id is not None):
         raise HTTPException(status_code=403, detail="Not authorized to view this game.")
 
-    moves = db.query(Move).filter(Move.game_id == game_id).order_by(Move.move_number).all()
-    board = reconstruct_board(moves)
+    moves = db.execute(SELECT_GAME_MOVES, {"game_id": game_id}).scalars().all()
+    board = board_rows(game.board_state or EMPTY_BOARD_STATE)
     move_entries = [
         MoveEntry(
             move_number=m.move_number,
-            player=db.query(User).filter(User.id == m.player_id).first().username,
+            player=m.player.username if m.player else "computer",
             row=m.row,
             col=m.col,
             symbol=m.symbol,
@@ -233,10 +295,7 @@ def get_game_state(
         )
         for m in moves
     ]
-    winner = None
-    if game.winner_id:
-        winner_user = db.query(User).filter(User.id == game.winner_id).first()
-        winner = winner_user.username if winner_user else None
+    winner = game.winner.username if game.winner else None
     is_draw = game.status == "draw"
 
     return GameStateResponse(
@@ -245,8 +304,8 @@ def get_game_state(
         current_turn=game.current_turn,
         status=game.status,
         moves=move_entries,
-        player_x=db.query(User).filter(User.id == game.player_x_id).first().username,
-        player_o=db.query(User).filter(User.id == game.player_o_id).first().username if game.player_o_id else None,
+        player_x=game.player_x.username,
+        player_o=game.player_o.username if game.player_o else None,
         winner=winner,
         is_draw=is_draw
     )
@@ -262,25 +321,20 @@ def get_game_state(
     }
 )
 def get_game_history(
-    db: Session = Depends(get_session_factory()),
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Return a list of finished or abandoned games for the current user."""
-    match_query = db.query(MatchHistory).filter(
-        (MatchHistory.player_x_id == current_user.id) | (MatchHistory.player_o_id == current_user.id)
-    ).order_by(MatchHistory.finished_at.desc())
+    match_query = db.execute(SELECT_USER_HISTORY, {"user_id": current_user.id}).scalars()
 
     games = []
     for match in match_query:
-        player_x = db.query(User).filter(User.id == match.player_x_id).first()
-        player_o = db.query(User).filter(User.id == match.player_o_id).first() if match.player_o_id else None
-        winner = db.query(User).filter(User.id == match.winner_id).first() if match.winner_id else None
         games.append(HistoryEntry(
             game_id=match.game_id,
-            player_x=player_x.username if player_x else "",
-            player_o=player_o.username if player_o else None,
+            player_x=match.player_x.username if match.player_x else "",
+            player_o=match.player_o.username if match.player_o else None,
             result=match.result,
-            winner=winner.username if winner else None,
+            winner=match.winner.username if match.winner else None,
             finished_at=match.finished_at.isoformat() if match.finished_at else ""
         ))
     return GameHistoryResponse(games=games)
@@ -1,10 +1,11 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.exc import IntegrityError
 
-from .db import get_session_factory, User
+from .db import get_db, User, SELECT_USER_BY_USERNAME_LC
 from .schemas import UserCreate, UserLogin, UserOut, Token
-from .auth import get_password_hash, verify_password, create_access_token
+from .auth import get_password_hash, verify_and_update_password, create_access_token
 from sqlalchemy.orm import Session
 
 from .game import router as game_router
@@ -12,6 +13,7 @@ from .game import router as game_router
 app = FastAPI(
     title="Tic Tac Toe API",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     description="API backend for Tic Tac Toe game with user management, session auth, game logic, and match history.\n\n"
                 "## Authentication\n"
                 "Authenticate using Bearer JWT token. Protected endpoints require:\n"
@@ -44,6 +46,8 @@ def health_check():
     """Basic health check to verify API is running."""
     return {"message": "Healthy"}
 
+# The auth handlers are deliberately plain `def`: FastAPI runs them in its threadpool,
+# so password hashing and the blocking DB calls both stay off the event loop.
 # PUBLIC_INTERFACE
 @app.post(
     "/register",
@@ -56,7 +60,7 @@ def health_check():
         400: {"description": "Username or email already exists."}
     }
 )
-def register_user(user: UserCreate = Body(...), db: Session = Depends(get_session_factory())):
+def register_user(user: UserCreate = Body(...), db: Session = Depends(get_db)):
     """
     Register a new Tic Tac Toe user account.
 
@@ -70,6 +74,7 @@ def register_user(user: UserCreate = Body(...), db: Session = Depends(get_sessio
 
     new_user = User(
         username=username,
+        username_lc=username,
         email=email,
         password_hash=password_hash,
     )
@@ -84,7 +89,7 @@ def register_user(user: UserCreate = Body(...), db: Session = Depends(get_sessio
             detail="Username or email already exists.",
         )
 
-    return UserOut.from_orm(new_user)
+    return UserOut.model_validate(new_user)
 
 # PUBLIC_INTERFACE
 @app.post(
@@ -97,19 +102,24 @@ def register_user(user: UserCreate = Body(...), db: Session = Depends(get_sessio
         401: {"description": "Incorrect username or password."}
     },
 )
-def login_user(login: UserLogin = Body(...), db: Session = Depends(get_session_factory())):
+def login_user(login: UserLogin = Body(...), db: Session = Depends(get_db)):
     """
     Authenticate user and return JWT bearer token.
 
     - **username**: Your username (case-insensitive)
     - **password**: Your password
     """
-    user = db.query(User).filter(User.username == login.username.lower()).first()
-    if not user or not verify_password(login.password, user.password_hash):
+    user = db.execute(SELECT_USER_BY_USERNAME_LC, {"username_lc": login.username.lower()}).scalar_one_or_none()
+    valid, new_hash = verify_and_update_password(login.password, user.password_hash) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password."
         )
+    # Upgrade legacy bcrypt hashes to argon2 now that we have the plaintext
+    if new_hash:
+        user.password_hash = new_hash
+        db.commit()
     # Issue JWT
     token = create_access_token({"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
 from typing import List, Optional
 
 # PUBLIC_INTERFACE
@@ -17,13 +17,12 @@ class UserLogin(BaseModel):
 # PUBLIC_INTERFACE
 class UserOut(BaseModel):
     """Public user info schema."""
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     username: str
     email: EmailStr
 
-    class Config:
-        orm_mode = True
-
 # PUBLIC_INTERFACE
 class Token(BaseModel):
     """JWT access token schema."""
@@ -56,28 +55,26 @@ class MoveResponse(BaseModel):
     winner: Optional[str] = Field(None, description="Username of the winner if game ended, else None")
     is_draw: bool = Field(..., description="Game ended in a draw?")
 
+class MoveEntry(BaseModel):
+    move_number: int
+    player: str
+    row: int
+    col: int
+    symbol: str
+    moved_at: str
+
 class GameStateResponse(BaseModel):
     """Response for getting game state."""
     game_id: int
     board: List[List[Optional[str]]]
     current_turn: str
     status: str
-    moves: List["MoveEntry"]
+    moves: List[MoveEntry]
     player_x: str
     player_o: Optional[str]
     winner: Optional[str]
     is_draw: bool
 
-class MoveEntry(BaseModel):
-    move_number: int
-    player: str
-    row: int
-    col: int
-    symbol: str
-    moved_at: str
-
-GameStateResponse.model_rebuild()
-
 class HistoryEntry(BaseModel):
     game_id: int
     player_x: str
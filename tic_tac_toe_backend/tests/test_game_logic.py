@@ -0,0 +1,62 @@
+import itertools
+
+import pytest
+
+from src.api.game import WIN_MASKS, board_masks, check_winner, computer_move
+
+
+def board_with(cells, symbol, filler=" "):
+    """Return a 9-char board with `symbol` at each index in `cells`."""
+    return "".join(symbol if i in cells else filler for i in range(9))
+
+
+def mask_cells(mask):
+    return [i for i in range(9) if mask >> i & 1]
+
+
+@pytest.mark.parametrize("symbol", ["X", "O"])
+@pytest.mark.parametrize("win", WIN_MASKS)
+def test_each_win_mask_detected_through_each_of_its_cells(win, symbol):
+    cells = mask_cells(win)
+    board = board_with(cells, symbol)
+    for last_idx in cells:
+        assert check_winner(*board_masks(board), last_idx) == symbol
+
+
+def test_incomplete_line_is_not_a_win():
+    board = "XX O     "
+    assert check_winner(*board_masks(board), 1) is None
+
+
+def test_full_board_without_line_is_draw():
+    board = "XOXXOOOXX"
+    for last_idx in range(9):
+        assert check_winner(*board_masks(board), last_idx) == "draw"
+
+
+def test_win_on_last_cell_beats_draw():
+    board = "XOXOXOOXX"
+    assert check_winner(*board_masks(board), 8) == "X"
+
+
+def test_computer_completes_own_line_before_blocking():
+    # O can win at 5 (row 3-4-5); X threatens 2 (row 0-1-2)
+    board = "XX OO    "
+    assert computer_move(board) == 5
+
+
+def test_computer_blocks_x():
+    board = "XX  O    "
+    assert computer_move(board) == 2
+
+
+def test_computer_takes_centre_on_open_board():
+    assert computer_move("X        ") == 4
+
+
+def test_computer_never_picks_occupied_cell():
+    for cells in itertools.product("XO ", repeat=9):
+        board = "".join(cells)
+        if " " not in board:
+            continue
+        assert board[computer_move(board)] == " "